@@ -1,8 +1,12 @@
+import collections
 import concurrent.futures
 import gc
+import heapq
+import logging
 import math
 import os
 import re
+import threading
 from datetime import datetime
 from packaging import version
 from typing import List, Tuple, Optional, Any, Dict
@@ -48,28 +52,28 @@ logger = get_logger()
 
 
 def _get_path(prefix: str, tp: bool = True, pp: bool = True, dp: bool = False, ep: bool = False) -> str:
-    path = ""
-    path += "_dp_rank_{:02d}".format(get_data_parallel_rank() if dp else 0)
-    path += "_ep_rank_{:02d}".format(get_expert_model_parallel_rank()) if ep else ""
-    path += "_tp_rank_{:02d}".format(get_tensor_model_parallel_rank() if tp else 0)
-    path += "_pp_rank_{:02d}".format(get_pipeline_model_parallel_rank() if pp else 0)
-    if path != "":
-        path = path[1:]
-    path += ".pt"
-    return f"{prefix}/{path}"
-
-
-def _determine_remove_tags(checkpoint_dir: BaseCheckpointStorage, num_kept: int) -> List[str]:
+    dp_rank = get_data_parallel_rank() if dp else 0
+    ep_part = "_ep_rank_{:02d}".format(get_expert_model_parallel_rank()) if ep else ""
+    tp_rank = get_tensor_model_parallel_rank() if tp else 0
+    pp_rank = get_pipeline_model_parallel_rank() if pp else 0
+    return f"{prefix}/dp_rank_{dp_rank:02d}{ep_part}_tp_rank_{tp_rank:02d}_pp_rank_{pp_rank:02d}.pt"
+
+
+def _determine_remove_tags(
+    checkpoint_dir: BaseCheckpointStorage, num_kept: int, tags_with_done: Optional[Dict[str, bool]] = None
+) -> List[str]:
     """
     deteremine checkpoint tags to be removed to satisfy num_kept
+    tags_with_done: result of checkpoint_dir.list_tags_with_done(), will be listed if not provided
     return value: a list of tags
     """
-    tags = checkpoint_dir.list_checkpoint_tags()
+    if tags_with_done is None:
+        tags_with_done = checkpoint_dir.list_tags_with_done()
 
     corrupted_tags = []
     completed_tags = []
-    for tag in tags:
-        if checkpoint_dir.file_exists(os.path.join(tag, "done")):
+    for tag, done in tags_with_done.items():
+        if done:
             completed_tags.append(tag)
         else:
             # corrupted checkpoint can be from interrupted deletion or interrupted save.
@@ -88,12 +92,42 @@ def _determine_remove_tags(checkpoint_dir: BaseCheckpointStorage, num_kept: int)
 
     return remove_tags
 
+# number of tensor files read ahead of time when loading a xser checkpoint
+_LOAD_PREFETCH_DEPTH = 4
+
 # Global ThreadPoolExecutor to avoid reinitialization
 _executor = None
 
-def _bulk_save(checkpoint_dir: BaseCheckpointStorage, save_items: List[Tuple[object, str]]) -> None:
-    for obj, filename in save_items:
-        checkpoint_dir.save_object(obj, filename)
+
+_DEFAULT_NUM_CHECKPOINT_WRITERS = 4
+
+
+def _get_num_checkpoint_writers() -> int:
+    """
+    number of files written concurrently by asynchronous checkpoint saving.
+    A single writer cannot saturate a NVMe drive, so several files are written
+    at the same time. Can be overwritten by the NXD_CKPT_WRITERS environment variable.
+    """
+    value = os.environ.get("NXD_CKPT_WRITERS", str(_DEFAULT_NUM_CHECKPOINT_WRITERS))
+    try:
+        num_writers = int(value)
+    except ValueError:
+        num_writers = 0
+    if num_writers < 1:
+        logger.warning(
+            "invalid NXD_CKPT_WRITERS value %s, using %d writers", value, _DEFAULT_NUM_CHECKPOINT_WRITERS
+        )
+        return _DEFAULT_NUM_CHECKPOINT_WRITERS
+    return num_writers
+
+
+def _coalesce_tensors_enabled() -> bool:
+    """
+    whether xser saving writes all tensors of a bin into a single file instead
+    of one file per tensor. Enabled by setting NXD_CKPT_COALESCE_TENSORS=1.
+    Checkpoints saved this way can be loaded by load_checkpoint, but not by xser.load().
+    """
+    return os.environ.get("NXD_CKPT_COALESCE_TENSORS", "0") == "1"
 
 
 class CheckpointIOState:
@@ -112,10 +146,9 @@ class CheckpointIOState:
         if self._async_save:
             self._checkpoint_dir = None
             global _executor
-            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-            self._save_items: List[Tuple[torch.Tensor, str]] = []
-            self._save_task: Optional[concurrent.futures.Future] = None
-            self._dcp_save_items: List[Tuple[Any]] = []
+            self._num_writers = _get_num_checkpoint_writers()
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._num_writers)
+            self._save_tasks: List[concurrent.futures.Future] = []
             self._dcp_save_task: Optional[concurrent.futures.Future] = None
             self._remove_tags: Optional[List[str]] = None
             self._remove_task: Optional[concurrent.futures.Future] = None
@@ -123,6 +156,8 @@ class CheckpointIOState:
 
     def begin(self, checkpoint_dir: BaseCheckpointStorage, tag: str) -> None:
         self._checkpoint_dir = checkpoint_dir
+        if self._async_save:
+            self._checkpoint_dir.set_num_concurrent_saves(self._num_writers)
 
         if self._async_save and self._current_tag is not None:
             self.wait_save(async_remove=True)
@@ -137,42 +172,47 @@ class CheckpointIOState:
             # this is to distinguish checkpoint from users' own data directory under output directory
             self._checkpoint_dir.save_text("1", os.path.join(self._current_tag, "checkpoint"))
 
-    def add_save_task(self, obj: Any, filename: str) -> None:
+    def add_save_task(self, obj: Any, filename: str, raw: bool = False) -> None:
+        """
+        save obj to filename. obj is not copied, the caller must not modify obj, or
+        the memory it refers to, until the save is completed. That is, when this
+        function returns for synced saving, and when wait_save() returns for async saving.
+        raw: obj is a contiguous uint8 cpu tensor whose bytes are written as is, without pickling.
+        """
         assert filename.startswith(self._current_tag + "/")
         relative_filename = filename[len(self._current_tag) + 1 :]
         self._relative_filenames.add(relative_filename)
+        assert self._checkpoint_dir
+        if raw:
+            save_fn, data = self._checkpoint_dir.save_bytes, memoryview(obj.numpy())
+        else:
+            save_fn, data = self._checkpoint_dir.save_object, obj
         if self._async_save:
-            self._save_items.append((obj, filename))
+            # hand the object to the long-lived writer right away, so that writing
+            # starts while the rest of the checkpoint is still being transferred.
+            # The host copy is released as soon as its own write completes.
+            self._save_tasks.append(_executor.submit(save_fn, data, filename))
         else:
-            assert self._checkpoint_dir
-            self._checkpoint_dir.save_object(obj, filename)
+            save_fn(data, filename)
 
     def add_dcp_save_task(self, checkpoint_dir: BaseCheckpointStorage, state_dict: dict, optimizer, model, ckpt_path):
         path = os.path.join(checkpoint_dir.dirname(), ckpt_path, "optim")
         aux_infos = dcp_utils.get_dcp_aux_infos(model, optimizer)
+        # staging: the host copy is made synchronously, so the trainer may update
+        # the device state as soon as this function returns
         state_dict_cpu = move_all_tensor_to_cpu(state_dict)
         if self._async_save:
-            self._dcp_save_items.append((path, state_dict_cpu, aux_infos))
+            # persisting: start writing right away instead of in end(), durability
+            # is only waited for at the next begin()
+            assert self._dcp_save_task is None, "only one DCP save task per checkpoint is supported"
+            # the executor owns the host copy, and drops it as soon as the write completes
+            self._dcp_save_task = _executor.submit(dcp_utils.save_optim_state_dict, path, state_dict_cpu, aux_infos)
         else:
             dcp_utils.save_optim_state_dict(path, state_dict_cpu, aux_infos)
 
-    def _dealloc_tensor_host_memory_callback(self, future):
-        """Future callback to asynchronous deallocate the tensor host memory
-        """
-        self._save_items = []
-        gc.collect()
-
     def end(self, num_kept: int) -> None:
         if self._async_save:
             self._num_kept = num_kept
-            if len(self._save_items) > 0:
-                self._save_task = _executor.submit(_bulk_save, self._checkpoint_dir, self._save_items)
-                # After save async thread is finished, use callback to async dealloc the tensor host memory
-                self._save_task.add_done_callback(self._dealloc_tensor_host_memory_callback)
-            if len(self._dcp_save_items) > 0:
-                self._dcp_save_task = _executor.submit(dcp_utils.save_optim_state_dict, *(self._dcp_save_items[0]))
-                # After save async thread is finished, use callback to async dealloc the tensor host memory
-                self._dcp_save_task.add_done_callback(self._dealloc_tensor_host_memory_callback)
             logger.info("async saving of checkpoint %s requested", self._current_tag)
         else:
             xm.rendezvous("saving checkpoint done")
@@ -186,42 +226,40 @@ class CheckpointIOState:
         if not self._async_save:
             return
 
-        # first wait for save to finish
-        if self._save_task:
-            done, _ = concurrent.futures.wait([self._save_task])
-            for f in done:
-                if f.exception():
-                    raise f.exception()
+        # first wait for save to finish, result() re-raises the exception of a failed task
+        for task in self._save_tasks:
+            task.result()
         if self._dcp_save_task:
-            done, _ = concurrent.futures.wait([self._dcp_save_task])
-            for f in done:
-                if f.exception():
-                    raise f.exception()
+            self._dcp_save_task.result()
+        # also wait for this worker's removal of files of the previous checkpoints,
+        # so that the rendezvous below covers both saving and removal.
+        remove_tags = self.wait_remove()
 
         xm.rendezvous("async saving checkpoint done")
 
-        if self._save_task:
-            self._save_task = None
-            # This is already asynchronously invoked in _dealloc_tensor_host_memory_callback
-            # However, this needs to be kept for the sync checkpointing case
-            self._save_items = []
-        if self._dcp_save_task:
-            self._dcp_save_task = None
-            self._dcp_save_items = []
+        self._save_tasks = []
+        self._dcp_save_task = None
         if torch.distributed.get_rank() == 0:
+            # every worker has deleted the files it wrote, rank 0 deletes what were left
+            if remove_tags:
+                self._checkpoint_dir.remove_dirs(remove_tags)
+                logger.info("async removal of %s completed", remove_tags)
             self._checkpoint_dir.save_text("1", os.path.join(self._current_tag, "done"))
 
+        # This rendezvous also makes sure no worker lists the checkpoint tags in
+        # submit_remove() while rank 0 is still deleting the directories above.
         xm.rendezvous("mark checkpoint as done")
 
         logger.info("async saving of checkpoint %s completed", self._current_tag)
 
         # remove checkpoint if necessary.
-        self.wait_remove()
         self.submit_remove(self._num_kept, async_remove=async_remove)
 
     def submit_remove(self, num_kept: int, async_remove: bool, remove_tags: Optional[List[str]] = None) -> None:
         remove_tags = remove_tags or []
-        remove_tags = remove_tags if len(remove_tags) else _determine_remove_tags(self._checkpoint_dir, num_kept)
+        # list the tags once, the result is also used to find out which tags to be removed are completed
+        tags_with_done = self._checkpoint_dir.list_tags_with_done()
+        remove_tags = remove_tags if len(remove_tags) else _determine_remove_tags(self._checkpoint_dir, num_kept, tags_with_done)
         xm.rendezvous("determine remove tags done")
         if len(remove_tags) == 0:
             logger.info("no checkpoints to remove.")
@@ -235,16 +273,20 @@ class CheckpointIOState:
             completed_tags = []
             for remove_tag in remove_tags:
                 done_file = os.path.join(remove_tag, "done")
-                if self._checkpoint_dir.file_exists(done_file):
+                if remove_tag in tags_with_done:
+                    done = tags_with_done[remove_tag]
+                else:
+                    done = self._checkpoint_dir.file_exists(done_file)
+                if done:
                     completed_tags.append(remove_tag)
                     self._checkpoint_dir.remove_file(done_file)
 
             logger.info("done tags in %s cleared", completed_tags)
 
+        relative_filenames = tuple(self._relative_filenames)
         remove_filenames = []
         for remove_tag in remove_tags:
-            for relative_filename in self._relative_filenames:
-                remove_filenames.append(os.path.join(remove_tag, relative_filename))
+            remove_filenames.extend(f"{remove_tag}/{relative_filename}" for relative_filename in relative_filenames)
 
         if async_remove:
             self._remove_tags = remove_tags
@@ -258,26 +300,19 @@ class CheckpointIOState:
                 self._checkpoint_dir.remove_dirs(remove_tags)
                 logger.info("previous checkpoint in %s successfully removed", remove_tags)
 
-    def wait_remove(self) -> None:
+    def wait_remove(self) -> List[str]:
+        """
+        wait for this worker's asynchronous removal of files to finish.
+        return value: the tags whose directories are still to be removed by rank 0,
+        after all workers finished removing their files.
+        """
+        remove_tags = []
         if self._remove_task:
-            done, _ = concurrent.futures.wait([self._remove_task])
-            for f in done:
-                if f.exception():
-                    raise f.exception()
-
-            xm.rendezvous("remove files done")
-            if torch.distributed.get_rank() == 0:
-                self._checkpoint_dir.remove_dirs(self._remove_tags)
-                logger.info("async removal of %s completed", self._remove_tags)
+            self._remove_task.result()
+            remove_tags = self._remove_tags
             self._remove_tags = None
             self._remove_task = None
-        # This rendevous is necessary, since it avoids the race condition that
-        # can occur when each worker is trying to find the next set of files to
-        # delete. Its a corner case, where worker 0 is still deleting, and worker
-        # 1 has moved on to the submit_remove task. It tries to find_files, and
-        # in the process runs into a race condition, resulting in file not found
-        # error.
-        xm.rendezvous("Wait for all workers to come from deletion")
+        return remove_tags
 
     def wait_all(self) -> None:
         # when this function is called, ThreadPool may have been shutdown.
@@ -305,6 +340,16 @@ def _get_ep_group_info() -> Tuple[int, int, int, int, int, int]:
     return emp_rank, edp_rank, emp_size, edp_size, emp_group, edp_group
 
 
+# select functions of the ToXlaTensorArena used by xser load and save. They do not
+# depend on the call, so they are defined once instead of for every call.
+def _is_xser_tensor_reference(v: Any) -> bool:
+    return isinstance(v, xser.TensorReference)
+
+
+def _is_tensor(v: Any) -> bool:
+    return isinstance(v, torch.Tensor)  # and xm.is_xla_tensor(v)
+
+
 def _xser_load_data(checkpoint_dir: BaseCheckpointStorage, path: str, groups: Optional[List[List[int]]] = None, ep_only: bool = False):
     """
     load tensors saved in path into a state_dict.
@@ -336,58 +381,154 @@ def _xser_load_data(checkpoint_dir: BaseCheckpointStorage, path: str, groups: Op
         ep_tensors = [(i, t) for i, t in enumerate(tensors) if _is_ep(ref_info[t.tid])]
         non_ep_tensors = [(i, t) for i, t in enumerate(tensors) if not _is_ep(ref_info[t.tid])]
 
-        def _load_tensors(tensor_list, _group, _rank, _group_size, _tensor_folder):
-            for idx, (original_idx, t) in enumerate(tensor_list):
-                tensor_file = os.path.join(_tensor_folder, "tensor_{}.pt".format(t.tid))
-
-                if (ref_info is not None) and (groups is not None):
-                    # When there is redundency (groups is not None) and we know the tensor's shape and dtype (ref_info is not None)
-                    # we use the following optimization:
-                    #    among workers that has same tensor (in same group), only 1 worker read tensor from disk
-                    #    other workers will get the tensor from network broadcasting
-                    #
-                    # we used round robin to select which worker will read from disk to evenly
-                    # distribute the load tasks.
-
-                    if (idx % _group_size) == _rank:
-                        loaded = checkpoint_dir.load_object(tensor_file).to(xm.xla_device())
+        # blobs of coalesced bins, keyed by file name. Each bin file is read by the first thread
+        # that needs it, other threads wait on its future. A blob is dropped once all tensors to
+        # be read from it have been sliced out, so that host memory is not held for bins whose
+        # tensors have already been moved to device.
+        loaded_bins: Dict[str, concurrent.futures.Future] = {}
+        bin_tensors_left: collections.Counter = collections.Counter()
+        loaded_bins_lock = threading.Lock()
+
+        def _read_bin(bin_file):
+            data = checkpoint_dir.load_bytes(bin_file)
+            # torch.frombuffer does not accept an empty buffer
+            if len(data) > 0:
+                return torch.frombuffer(data, dtype=torch.uint8)
+            return torch.empty(0, dtype=torch.uint8)
+
+        def _read_tensor(_tensor_folder, tid):
+            if ref_info is None or "bin" not in ref_info[tid]:
+                return checkpoint_dir.load_object(os.path.join(_tensor_folder, "tensor_{}.pt".format(tid)))
+
+            info = ref_info[tid]
+            bin_file = _get_coalesced_bin_file(_tensor_folder, info["bin"])
+            with loaded_bins_lock:
+                bin_future = loaded_bins.get(bin_file)
+                is_reader = bin_future is None
+                if is_reader:
+                    bin_future = concurrent.futures.Future()
+                    loaded_bins[bin_file] = bin_future
+            # the file is read outside of the lock, so that other prefetch threads are not blocked
+            if is_reader:
+                try:
+                    bin_future.set_result(_read_bin(bin_file))
+                except BaseException as e:
+                    bin_future.set_exception(e)
+                    raise
+            nbytes = math.prod(info["shape"]) * torch.empty(0, dtype=info["dtype"]).element_size()
+            blob = bin_future.result()[info["offset"] : info["offset"] + nbytes]
+            with loaded_bins_lock:
+                bin_tensors_left[bin_file] -= 1
+                if bin_tensors_left[bin_file] == 0:
+                    del loaded_bins[bin_file]
+            # the slice keeps the bytes it refers to alive until the tensor is consumed
+            return blob.view(info["dtype"]).reshape(info["shape"])
+
+        def _read_from_disk(tensor_list, _rank, _group_size):
+            # When there is redundency (groups is not None) and we know the tensor's shape and dtype (ref_info is not None)
+            # we use the following optimization:
+            #    among workers that has same tensor (in same group), only 1 worker read tensor from disk
+            #    other workers will get the tensor from network broadcasting
+            #
+            # we used round robin to select which worker will read from disk to evenly
+            # distribute the load tasks. For coalesced bins, the round robin is over bins,
+            # so that each bin file is read by only one worker.
+            #
+            # when dtype and shape are not available or there is no redundency, all workers load tensor from disk
+            if ref_info is None or groups is None:
+                return [True] * len(tensor_list)
+            from_disk = []
+            for idx, (_, t) in enumerate(tensor_list):
+                reader = ref_info[t.tid]["bin"] if "bin" in ref_info[t.tid] else idx
+                from_disk.append((reader % _group_size) == _rank)
+            return from_disk
+
+        def _load_tensors(tensor_list, from_disk, _group, _tensor_folder):
+            use_broadcast = (ref_info is not None) and (groups is not None)
+            disk_tids = [t.tid for (_, t), read in zip(tensor_list, from_disk) if read]
+
+            # files are read by background threads ahead of time, so that reading the next
+            # tensors from disk overlaps with transferring the current one to device.
+            broadcast_tensors = []
+            prefetched: collections.deque = collections.deque()
+            num_submitted = 0
+            with concurrent.futures.ThreadPoolExecutor(max_workers=_LOAD_PREFETCH_DEPTH) as prefetcher:
+                for (original_idx, t), read in zip(tensor_list, from_disk):
+                    while num_submitted < len(disk_tids) and len(prefetched) < _LOAD_PREFETCH_DEPTH:
+                        prefetched.append(prefetcher.submit(_read_tensor, _tensor_folder, disk_tids[num_submitted]))
+                        num_submitted += 1
+
+                    if read:
+                        loaded = prefetched.popleft().result().to(xm.xla_device())
                     else:
                         dtype = ref_info[t.tid]["dtype"]
                         shape = ref_info[t.tid]["shape"]
                         loaded = torch.zeros(shape, dtype=dtype, device=xm.xla_device())
 
-                    # we use all_reduce to implement broadcast because xla does not have native broadcast support.
-                    xm.all_reduce(xm.REDUCE_SUM, [loaded], groups=_group)
-                else:
-                    # when dtype and shape are not available or there is no redundency, all workers load tensor from disk
-                    loaded = checkpoint_dir.load_object(tensor_file).to(xm.xla_device())
+                    if use_broadcast:
+                        broadcast_tensors.append(loaded)
+                    rewritten_tensors[original_idx] = loaded
 
-                rewritten_tensors[original_idx] = loaded
+            # we use all_reduce to implement broadcast because xla does not have native broadcast support.
+            # xm.collective_broadcast is implemented the same way, with an extra multiply on every tensor.
+            # All tensors are reduced in a single in-place all_reduce, instead of one all_reduce per tensor.
+            if len(broadcast_tensors) > 0:
+                xm.all_reduce(xm.REDUCE_SUM, broadcast_tensors, groups=_group)
 
+        # each pass is (tensor list, group, rank in group, group size, tensor folder)
         if groups is not None:
-            _load_tensors(ep_tensors, edp_group, edp_rank, edp_size, ep_tensor_folder)
-            _load_tensors(non_ep_tensors, groups, my_rank_in_group, my_group_size, non_ep_tensor_folder)
+            passes = [
+                (ep_tensors, edp_group, edp_rank, edp_size, ep_tensor_folder),
+                (non_ep_tensors, groups, my_rank_in_group, my_group_size, non_ep_tensor_folder),
+            ]
         elif ep_only:
-            _load_tensors(ep_tensors, None, None, None, ep_tensor_folder)
+            passes = [(ep_tensors, None, None, None, ep_tensor_folder)]
         else:
-            _load_tensors(ep_tensors + non_ep_tensors, None, None, None, ep_tensor_folder)
+            passes = [(ep_tensors + non_ep_tensors, None, None, None, ep_tensor_folder)]
+        passes_from_disk = [_read_from_disk(tensor_list, _rank, _group_size) for tensor_list, _, _rank, _group_size, _ in passes]
+
+        # the tensors read from each bin are counted over all passes before reading any, because
+        # the two passes read the same bin file when the ep and non-ep tensor folders are the same.
+        if ref_info is not None:
+            for (tensor_list, _, _, _, _tensor_folder), from_disk in zip(passes, passes_from_disk):
+                bin_tensors_left.update(
+                    _get_coalesced_bin_file(_tensor_folder, ref_info[t.tid]["bin"])
+                    for (_, t), read in zip(tensor_list, from_disk)
+                    if read and "bin" in ref_info[t.tid]
+                )
+
+        for (tensor_list, _group, _, _, _tensor_folder), from_disk in zip(passes, passes_from_disk):
+            _load_tensors(tensor_list, from_disk, _group, _tensor_folder)
 
         if groups is not None:
             xm.mark_step()
         return rewritten_tensors
 
-    def select_fn(v):
-        return isinstance(v, xser.TensorReference)
-
-    return xm.ToXlaTensorArena(convert_fn, select_fn).transform(ref_data)
+    return xm.ToXlaTensorArena(convert_fn, _is_xser_tensor_reference).transform(ref_data)
 
 
 class _InternalTensorReference:
-    def __init__(self, tid, shape, dtype, expert_model_parallel):
+    def __init__(self, tid, shape, dtype, expert_model_parallel, bin_id=None, offset=None):
         self.tid = tid
         self.shape = shape
         self.dtype = dtype
         self.expert_model_parallel = expert_model_parallel
+        # location of the tensor when it is saved in a coalesced bin file
+        self.bin_id = bin_id
+        self.offset = offset
+
+
+# byte alignment of tensors inside a coalesced bin file
+_COALESCED_TENSOR_ALIGNMENT = 64
+
+
+def _get_coalesced_bin_file(path: str, bin_id: int) -> str:
+    # bin files contain the raw bytes of the tensors, they are not pickled
+    return os.path.join(path, "bin_{}.raw".format(bin_id))
+
+
+def _is_expert_parallel(t: torch.Tensor) -> bool:
+    return hasattr(t, "expert_model_parallel") and t.expert_model_parallel
 
 
 def _assign_tensors_to_bins(tensors: List[torch.Tensor], bin_count: int) -> List[List[int]]:
@@ -402,33 +543,105 @@ def _assign_tensors_to_bins(tensors: List[torch.Tensor], bin_count: int) -> List
     """
 
     bin_tidxs = [[] for i in range(bin_count)]
-    bin_sizes = [0 for i in range(bin_count)]
 
     tensor_sizes = []
     for i, tensor in enumerate(tensors):
         tensor_sizes.append((i, torch.numel(tensor) * tensor.element_size()))
 
-    # we use Karmarkar–Karp bin packing algorithm to yield most evenly distributed bin
-    # total size. It goes like the following:
-    # First, sort tensor by size.
+    # we use the longest-processing-time-first greedy algorithm to yield most evenly
+    # distributed bin total size. It goes like the following:
+    # First, sort tensor by size in descending order.
     # Then loop over all tensors.
     # For each tensor find the bin with smallest total size, and assign the tensor
-    # to the bin.
-    tensor_sizes = sorted(tensor_sizes, key=lambda a: a[1])
+    # to the bin. Bins are kept in a min-heap of (total size, bin id), so finding
+    # the smallest bin is O(log bin_count).
+    tensor_sizes.sort(key=lambda a: -a[1])
 
+    bin_heap = [(0, bid) for bid in range(bin_count)]
+    heapq.heapify(bin_heap)
     for tidx, tensor_size in tensor_sizes:
-        bid = bin_sizes.index(min(bin_sizes))
+        bin_size, bid = heapq.heappop(bin_heap)
         bin_tidxs[bid].append(tidx)
-        bin_sizes[bid] += tensor_size
+        heapq.heappush(bin_heap, (bin_size + tensor_size, bid))
     return bin_tidxs
 
 
+def _coalesced_bin_layout(tensors: List[torch.Tensor], bins: List[List[int]]) -> List[Tuple[int, int]]:
+    """
+    compute the location of each tensor when the tensors of a bin are coalesced
+    into a single blob. Expert parallel tensors are placed first, so that their offsets
+    are the same in the blobs of expert parallel ranks that only save those tensors.
+    Return a list of (bin id, byte offset), indexed by tensor id.
+    """
+    layout: List[Tuple[int, int]] = [(0, 0)] * len(tensors)
+    for bid, tidxs in enumerate(bins):
+        offset = 0
+        for tidx in sorted(tidxs, key=lambda i: not _is_expert_parallel(tensors[i])):
+            layout[tidx] = (bid, offset)
+            nbytes = torch.numel(tensors[tidx]) * tensors[tidx].element_size()
+            offset += -(-nbytes // _COALESCED_TENSOR_ALIGNMENT) * _COALESCED_TENSOR_ALIGNMENT
+    return layout
+
+
+def _save_tensors_coalesced(
+    tensors: List[torch.Tensor], tids: List[int], layout: List[Tuple[int, int]], path: str, iostate: CheckpointIOState
+) -> None:
+    """
+    copy tensors of the same bin into one host blob at the offsets given by layout,
+    and save the blob as a single file. The blob is written as raw bytes, dtype and shape
+    of the tensors are kept in the info.pt file, so no pickling is needed.
+    """
+    if len(tids) == 0:
+        return
+
+    nbytes = [torch.numel(tensors[i]) * tensors[i].element_size() for i in tids]
+    blob = torch.empty(max(layout[i][1] + n for i, n in zip(tids, nbytes)), dtype=torch.uint8)
+    for i, n in zip(tids, nbytes):
+        offset = layout[i][1]
+        blob[offset : offset + n].view(tensors[i].dtype).view(tensors[i].shape).copy_(tensors[i])
+    iostate.add_save_task(blob, _get_coalesced_bin_file(path, layout[tids[0]][0]), raw=True)
+
+
+def _save_tensors_pipelined(
+    tensors: List[torch.Tensor], tids: List[int], path: str, iostate: CheckpointIOState
+) -> None:
+    """
+    transfer tensors to host memory one by one and save them on a writer thread, so that
+    the device to host copy of the next tensor overlaps with the write of the current one.
+    At most two writes are pending, which bounds the number of host copies alive at a time.
+    Only used for synced saving.
+    """
+    in_flight: collections.deque = collections.deque()
+    # timing is only collected when it is going to be logged, and reported once for all tensors
+    log_timing = logger.isEnabledFor(logging.DEBUG)
+    transfer_seconds = 0.0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as writer:
+        for i in tids:
+            while len(in_flight) >= 2:
+                in_flight.popleft().result()
+
+            if log_timing:
+                t0 = datetime.now()
+            cpu_data = tensors[i].cpu()
+            if log_timing:
+                transfer_seconds += (datetime.now() - t0).total_seconds()
+
+            in_flight.append(writer.submit(iostate.add_save_task, cpu_data, xser._get_tensor_file(path, i)))
+
+        for task in in_flight:
+            task.result()
+
+    if log_timing:
+        logger.debug("    transfer %d tensors to cpu elapsed: %d seconds", len(tids), transfer_seconds)
+
+
 def _xser_save_data(
     checkpoint_dir: BaseCheckpointStorage, path: str, state_dict, iostate: CheckpointIOState, groups: Optional[List[List[int]]] = None
 ) -> Any:
     """
     This function save the tensors in a state_dict into a directory.
-    Each tensor will be saved as a separate file.
+    Each tensor will be saved as a separate file, unless NXD_CKPT_COALESCE_TENSORS is enabled,
+    in which case the tensors saved by a worker are coalesced into a single file.
     Args:
       path: a directory that tensors will be written to
       state_dict: a state dict
@@ -444,43 +657,82 @@ def _xser_save_data(
     def convert_fn(tensors: List[torch.Tensor]) -> List[torch.Tensor]:
         torch_xla._XLAC._xla_sync_multi(tensors, devices=[], wait=True, sync_xla_data=True)
 
+        coalesce = _coalesce_tensors_enabled()
         if groups is None:
             my_tensors = None
+            bins = [list(range(len(tensors)))]
         else:
-            my_tensors = _assign_tensors_to_bins(tensors, edp_size)[edp_rank]
+            bins = _assign_tensors_to_bins(tensors, edp_size)
+            # a set, so that the membership test below is O(1) per tensor
+            my_tensors = set(bins[edp_rank])
+        layout = _coalesced_bin_layout(tensors, bins) if coalesce else None
 
+        save_tids = []
         rewritten_tensors = []
         for i, t in enumerate(tensors):
-            is_expert_parallel = hasattr(t, "expert_model_parallel") and t.expert_model_parallel
-            if (my_tensors is None) or (i in my_tensors):
-                t0 = datetime.now()
-                cpu_data = t.cpu()
-                t1 = datetime.now()
-                # if the below condition is not satisfied, someone else will store the same data
-                if my_tensors is None or (is_expert_parallel or emp_rank == 0):
-                    iostate.add_save_task(cpu_data, xser._get_tensor_file(path, i))
-                logger.debug("    transfer tensor %d to cpu elapsed: %d seconds", i, (t1 - t0).total_seconds())
-            rewritten_tensors.append(_InternalTensorReference(i, t.shape, t.dtype, is_expert_parallel))
+            is_expert_parallel = _is_expert_parallel(t)
+            # if the below condition is not satisfied, someone else will store the same data
+            if (my_tensors is None) or (i in my_tensors and (is_expert_parallel or emp_rank == 0)):
+                save_tids.append(i)
+            bin_id, offset = layout[i] if coalesce else (None, None)
+            rewritten_tensors.append(_InternalTensorReference(i, t.shape, t.dtype, is_expert_parallel, bin_id, offset))
+
+        if coalesce:
+            _save_tensors_coalesced(tensors, save_tids, layout, path, iostate)
+        elif iostate._async_save:
+            # asynchronous saving keeps every host copy alive until the checkpoint is
+            # written, therefore the transfers cannot be pipelined with the writes. Instead,
+            # all device tensors are transferred in one batch, which waits for the device
+            # once instead of once per tensor.
+            xla_tids = [i for i in save_tids if tensors[i].device.type == "xla"]
+            t0 = datetime.now()
+            cpu_tensors = dict(zip(xla_tids, torch_xla._XLAC._xla_get_cpu_tensors([tensors[i] for i in xla_tids])))
+            t1 = datetime.now()
+            logger.debug("    transfer %d tensors to cpu elapsed: %d seconds", len(xla_tids), (t1 - t0).total_seconds())
+            for i in save_tids:
+                cpu_data = cpu_tensors[i] if i in cpu_tensors else tensors[i].cpu()
+                iostate.add_save_task(cpu_data, xser._get_tensor_file(path, i))
+        else:
+            _save_tensors_pipelined(tensors, save_tids, path, iostate)
         return rewritten_tensors
 
-    def select_fn(v):
-        return isinstance(v, torch.Tensor)  # and xm.is_xla_tensor(v)
-
     checkpoint_dir.create_shared_dir(path)
-    return xm.ToXlaTensorArena(convert_fn, select_fn).transform(state_dict)
+    return xm.ToXlaTensorArena(convert_fn, _is_tensor).transform(state_dict)
 
 
 def _extract_tensor_info_and_update_state_dict(state_dict: Dict[str, Any], tensor_info: Dict[int, Dict[str, Any]]) -> None:
     """
     for a given state_dict, replace _InternalTensorReference with XserTensorReference,
     and put the dtype and shape in a separate accout.
+    The state_dict is walked iteratively, so deeply nested state_dicts do not hit the
+    recursion limit. References nested in lists and tuples are replaced as well.
     """
-    for k, v in state_dict.items():
-        if isinstance(v, _InternalTensorReference):
-            tensor_info[v.tid] = {"dtype": v.dtype, "shape": v.shape, "expert_model_parallel": v.expert_model_parallel}
-            state_dict[k] = xser.TensorReference(v.tid)
-        if isinstance(v, dict):
-            _extract_tensor_info_and_update_state_dict(v, tensor_info)
+    # tuples are immutable, therefore they are replaced by lists during the walk and
+    # converted back afterwards. An inner tuple is always recorded after its outer tuple,
+    # so converting them in reverse order converts inner tuples first.
+    tuples: List[Tuple[Any, Any, type]] = []
+    stack: List[Any] = [state_dict]
+    while stack:
+        container = stack.pop()
+        items = list(container.items()) if isinstance(container, dict) else list(enumerate(container))
+        for k, v in items:
+            cls = v.__class__
+            if cls is _InternalTensorReference:
+                tensor_info[v.tid] = {"dtype": v.dtype, "shape": v.shape, "expert_model_parallel": v.expert_model_parallel}
+                if v.bin_id is not None:
+                    tensor_info[v.tid]["bin"] = v.bin_id
+                    tensor_info[v.tid]["offset"] = v.offset
+                container[k] = xser.TensorReference(v.tid)
+            elif isinstance(v, (dict, list)):
+                stack.append(v)
+            elif isinstance(v, tuple):
+                container[k] = list(v)
+                tuples.append((container, k, cls))
+                stack.append(container[k])
+
+    for container, k, cls in reversed(tuples):
+        # namedtuples take their fields as separate arguments
+        container[k] = cls(*container[k]) if hasattr(cls, "_fields") else cls(container[k])
 
 
 def _save(
@@ -503,13 +755,12 @@ def _save(
             iostate.add_save_task(tensor_info, path + ".info.pt")
         return
 
-    local_rank = xm.get_local_ordinal()
-    for worker in range(math.ceil(get_local_world_size() / num_workers)):
-        if groups is None or my_rank_in_group == 0:
-            if local_rank // num_workers == worker:
-                logger.debug(f"worker {local_rank} saving checkpoint {path}")
-                cpu_data = move_all_tensor_to_cpu(ckpt)
-                iostate.add_save_task(cpu_data, path)
+    # there is no rendezvous between saving workers, so all local workers save
+    # concurrently. num_workers only throttles loading, see _load.
+    if groups is None or my_rank_in_group == 0:
+        logger.debug(f"worker {xm.get_local_ordinal()} saving checkpoint {path}")
+        cpu_data = move_all_tensor_to_cpu(ckpt)
+        iostate.add_save_task(cpu_data, path)
 
 
 def _load_obj_from_state_dict(obj: Any, state_dict: Dict[str, Any], strict: bool) -> None:
@@ -590,12 +841,20 @@ def save_checkpoint(
       - tag:
         - model or optim:
           - dp_rank_xx_tp_rank_xx_pp_rank_xx.pt (ref_data file)
+          - dp_rank_xx_tp_rank_xx_pp_rank_xx.pt.info.pt (dtype and shape of each tensor)
           - dp_rank_xx_tp_rank_xx_pp_rank_xx.pt.tensors:
             - tensor_x.pt
         - scheduler.pt
         - user_content.pt
       - newest
 
+    When the environment variable ``NXD_CKPT_COALESCE_TENSORS`` is ``1``, the tensors
+    a worker saves are written as raw bytes into a single file instead, and their
+    location is recorded in the info.pt file. Such checkpoints can only be loaded
+    with ``load_checkpoint``, not with ``xser.load``:
+          - dp_rank_xx_tp_rank_xx_pp_rank_xx.pt.tensors:
+            - bin_x.raw
+
     Otherwise, the file structure looks like:
     - output_dir:
       - tag:
@@ -619,10 +878,11 @@ def save_checkpoint(
         user_content:
             user contents to save, optional.
         num_workers (int):
-            num of workers to save the checkpoints on the same time, range: 1-32.
+            kept for compatibility, saving is not throttled: all workers save their checkpoints
+            at the same time. ``num_workers`` only limits concurrent workers when loading,
+            see ``load_checkpoint``.
         use_xser (bool):
-            whether to use torch-xla serialization. When enabled, ``num_workers`` will be ignored
-            and maximum num of workers will be used. Default: ``False``.
+            whether to use torch-xla serialization. Default: ``False``.
         num_kept_ckpts (int):
             number of checkpoints to keep on disk, optional. Default: ``None``.
         async_save (bool):
@@ -1,13 +1,17 @@
+import concurrent.futures
+import errno
 import fnmatch
 import glob
 import logging
+import mmap
 import os
 import random
 import shutil
+import threading
 import time
 from abc import abstractmethod
 from io import BytesIO
-from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+from typing import List, Dict, Any, Optional, Tuple, Union, TYPE_CHECKING
 
 import boto3
 import botocore
@@ -44,6 +48,15 @@ class BaseCheckpointStorage:
     def list_completed_checkpoint_tags(self) -> List[str]:
         return self.find_subdirs_contain_path(pattern="done", search_depth=1, sort_by_mdate=True)
 
+    def list_tags_with_done(self) -> Dict[str, bool]:
+        """
+        return a dict from checkpoint tag to whether the tag has a "done" file,
+        ordered the same way as list_checkpoint_tags(). This avoids probing the
+        "done" file of every tag separately.
+        """
+        completed_tags = set(self.list_completed_checkpoint_tags())
+        return {tag: tag in completed_tags for tag in self.list_checkpoint_tags()}
+
     def find_subdirs_contain_path(
         self,
         pattern: str,
@@ -81,6 +94,16 @@ class BaseCheckpointStorage:
     def save_text(self, text: str, filename: str) -> None:
         raise NotImplementedError
 
+    def set_num_concurrent_saves(self, num_saves: int) -> None:
+        """
+        hint that up to num_saves files are saved at the same time, so that storages
+        which parallelize a single save can reduce the parallelism of each save.
+        """
+
+    @abstractmethod
+    def save_bytes(self, data: Union[bytes, memoryview], filename: str) -> None:
+        raise NotImplementedError
+
     @abstractmethod
     def save_object(self, obj: object, filename: str) -> None:
         raise NotImplementedError
@@ -89,6 +112,10 @@ class BaseCheckpointStorage:
     def load_object(self, filename: str, map_location: torch.serialization.MAP_LOCATION = None) -> Any:
         raise NotImplementedError
 
+    @abstractmethod
+    def load_bytes(self, filename: str) -> Union[bytearray, memoryview]:
+        raise NotImplementedError
+
     @abstractmethod
     def create_dir(self, dirname: str, exist_ok: bool = True) -> None:
         raise NotImplementedError
@@ -117,7 +144,23 @@ class BaseCheckpointStorage:
                 self.remove_file(filename)
 
 
+def _direct_io_enabled() -> bool:
+    """
+    whether large files are written with O_DIRECT. Enabled by setting NXD_CKPT_DIRECT_IO=1.
+    It helps on local NVMe, but on network filesystems such as FSx Lustre or NFS the
+    synchronous writes and the extra copy into the aligned buffer make saving slower.
+    """
+    return os.environ.get("NXD_CKPT_DIRECT_IO", "0") == "1"
+
+
 class FilesysCheckpointStorage(BaseCheckpointStorage):
+    # when NXD_CKPT_DIRECT_IO=1, files larger than this are written with O_DIRECT, because
+    # checkpoint files are not read back on the same node, and caching them only adds memory pressure.
+    DIRECT_IO_THRESHOLD = 16 * 1048576
+    DIRECT_IO_ALIGNMENT = 4096
+    # size of the aligned bounce buffer O_DIRECT writes go through
+    DIRECT_IO_CHUNK_SIZE = 64 * 1048576
+
     def __init__(self, dirname: str):
         super().__init__(dirname)
 
@@ -172,7 +215,55 @@ class FilesysCheckpointStorage(BaseCheckpointStorage):
         with open(filename, "w") as f:
             f.write(text)
 
+    def save_bytes(self, data: Union[bytes, memoryview], filename: str) -> None:
+        filename = os.path.join(self._dirname, filename)
+        if (
+            _direct_io_enabled()
+            and hasattr(os, "O_DIRECT")
+            and memoryview(data).nbytes > FilesysCheckpointStorage.DIRECT_IO_THRESHOLD
+        ):
+            try:
+                FilesysCheckpointStorage._save_bytes_direct(data, filename)
+                return
+            except OSError as e:
+                # some filesystems (e.g. tmpfs) do not support O_DIRECT, use buffered write instead
+                if e.errno != errno.EINVAL:
+                    raise
+
+        with open(filename, "wb") as f:
+            f.write(data)
+
+    @staticmethod
+    def _save_bytes_direct(data: Union[bytes, memoryview], filename: str) -> None:
+        """
+        write data bypassing the page cache. O_DIRECT requires the buffer address and the
+        write size to be aligned, so data is written in chunks through a page aligned bounce
+        buffer of DIRECT_IO_CHUNK_SIZE bytes. Only the last chunk is padded to DIRECT_IO_ALIGNMENT,
+        and the file is truncated to the actual size afterwards.
+        """
+        source = memoryview(data).cast("B")
+        nbytes = source.nbytes
+        alignment = FilesysCheckpointStorage.DIRECT_IO_ALIGNMENT
+        chunk_size = min(FilesysCheckpointStorage.DIRECT_IO_CHUNK_SIZE, -(-nbytes // alignment) * alignment)
+        # anonymous mmap is page aligned
+        with mmap.mmap(-1, chunk_size) as buffer, memoryview(buffer) as view:
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT | os.O_DSYNC, 0o666)
+            try:
+                for start in range(0, nbytes, chunk_size):
+                    end = min(start + chunk_size, nbytes)
+                    view[: end - start] = source[start:end]
+                    padded_nbytes = -(-(end - start) // alignment) * alignment
+                    view[end - start : padded_nbytes] = bytes(padded_nbytes - (end - start))
+                    written = 0
+                    while written < padded_nbytes:
+                        written += os.write(fd, view[written:padded_nbytes])
+                os.ftruncate(fd, nbytes)
+            finally:
+                os.close(fd)
+
     def save_object(self, obj: Any, filename: str) -> None:
+        # torch.save streams into the file, each tensor is written with a single large write.
+        # Serializing in memory first would double the host memory needed per save.
         filename = os.path.join(self._dirname, filename)
         torch.save(obj, filename)
 
@@ -180,6 +271,13 @@ class FilesysCheckpointStorage(BaseCheckpointStorage):
         filename = os.path.join(self._dirname, filename)
         return torch.load(filename, map_location=map_location)
 
+    def load_bytes(self, filename: str) -> Union[bytearray, memoryview]:
+        filename = os.path.join(self._dirname, filename)
+        data = bytearray(os.path.getsize(filename))
+        with open(filename, "rb") as f:
+            f.readinto(data)
+        return data
+
     def remove_dir(self, dirname: str) -> None:
         dirname = os.path.join(self._dirname, dirname)
         if os.path.exists(dirname):
@@ -190,6 +288,12 @@ class FilesysCheckpointStorage(BaseCheckpointStorage):
         if os.path.exists(filename):
             os.unlink(filename)
 
+    def remove_files(self, filenames: List[str]) -> None:
+        # removing files is I/O bound, so issue the removals concurrently
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            for _ in executor.map(self.remove_file, filenames):
+                pass
+
     def create_dir(self, dirname: str, exist_ok: bool = True) -> None:
         dirname = os.path.join(self._dirname, dirname)
         os.makedirs(dirname, exist_ok=exist_ok)
@@ -221,6 +325,12 @@ class S3CheckpointStorage(BaseCheckpointStorage):
     DOWNLOAD = 2
     REMOVE_DIR = 3
     REMOVE_FILE = 4
+    REMOVE_FILES = 5
+
+    # maximum number of keys accepted by a single delete_objects request
+    MAX_DELETE_KEYS = 1000
+    # number of upload threads, shared by the files that are saved at the same time
+    UPLOAD_MAX_CONCURRENCY = 10
 
     def __init__(self, dirname: str):
         super().__init__(dirname)
@@ -230,6 +340,11 @@ class S3CheckpointStorage(BaseCheckpointStorage):
 
         boto3.set_stream_logger(name="botocore.credentials", level=logging.ERROR)
 
+        # the client is created lazily, see _get_client()
+        self._client: Optional["S3Client"] = None
+        self._client_lock = threading.Lock()
+        self._upload_max_concurrency = S3CheckpointStorage.UPLOAD_MAX_CONCURRENCY
+
     def dir_exists(self, dirname: str) -> bool:
         """
         s3 allow create files with common prefix at the same time, therefore
@@ -250,8 +365,24 @@ class S3CheckpointStorage(BaseCheckpointStorage):
 
         return False
 
+    def list_tags_with_done(self) -> Dict[str, bool]:
+        """
+        list each tag directory once, and look for both the "checkpoint" and
+        the "done" file in the same listing.
+        """
+        tag_mdate_done = []
+        for path in self._list_with_retry(None):
+            if path["type"] != "dir":
+                continue
+            files = {p["name"]: p for p in self._list_with_retry(path["name"]) if p["type"] == "file"}
+            if "checkpoint" in files:
+                tag_mdate_done.append((path["name"], files["checkpoint"]["mdate"], "done" in files))
+
+        tag_mdate_done.sort(key=lambda x: x[1])
+        return {tag: done for tag, _, done in tag_mdate_done}
+
     def _list(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
-        s3 = S3CheckpointStorage.get_client()
+        s3 = self._get_client()
 
         if self._base_key and prefix:
             list_prefix = os.path.join(self._base_key, prefix)
@@ -334,6 +465,9 @@ class S3CheckpointStorage(BaseCheckpointStorage):
         files = [x[0] for x in file_mdate_pairs]
         return files
 
+    def set_num_concurrent_saves(self, num_saves: int) -> None:
+        self._upload_max_concurrency = max(1, S3CheckpointStorage.UPLOAD_MAX_CONCURRENCY // num_saves)
+
     def save_text(self, text: str, filename: str) -> None:
         class TextStreamCreator:
             def __init__(self, text: str):
@@ -346,6 +480,16 @@ class S3CheckpointStorage(BaseCheckpointStorage):
 
         self.upload_stream_to_file(TextStreamCreator(text), filename)
 
+    def save_bytes(self, data: Union[bytes, memoryview], filename: str) -> None:
+        class BytesStreamCreator:
+            def __init__(self, data: Union[bytes, memoryview]):
+                self._data = data
+
+            def create_stream(self) -> BytesIO:
+                return BytesIO(self._data)
+
+        self.upload_stream_to_file(BytesStreamCreator(data), filename)
+
     def save_object(self, obj: object, filename: str) -> None:
         class ObjectStreamCreator:
             def __init__(self, obj: object):
@@ -362,6 +506,9 @@ class S3CheckpointStorage(BaseCheckpointStorage):
         stream: BytesIO = self.download_file_to_stream(filename)
         return torch.load(stream, map_location=map_location)
 
+    def load_bytes(self, filename: str) -> Union[bytearray, memoryview]:
+        return self.download_file_to_stream(filename).getbuffer()
+
     def create_dir(self, dirname: str, exist_ok: bool = True) -> None:
         """
         s3 allow create files with common prefix at the same time, therefore
@@ -378,22 +525,36 @@ class S3CheckpointStorage(BaseCheckpointStorage):
 
     def remove_dir(self, dirname: str) -> None:
         key = self.convert_path_to_key(dirname)
-        client = S3CheckpointStorage.get_client()
+        client = self._get_client()
         S3CheckpointStorage.s3_action_with_retry(
             S3CheckpointStorage.REMOVE_DIR, client, self._bucket, key, None
         )
 
     def remove_file(self, filename: str) -> None:
         key = self.convert_path_to_key(filename)
-        client = S3CheckpointStorage.get_client()
+        client = self._get_client()
         S3CheckpointStorage.s3_action_with_retry(
             S3CheckpointStorage.REMOVE_FILE, client, self._bucket, key, None
         )
 
+    def remove_files(self, filenames: List[str]) -> None:
+        """
+        remove files with batched delete_objects requests. Deleting a key that does
+        not exist is not an error for s3, so existence is not checked per file.
+        """
+        keys = [self.convert_path_to_key(filename) for filename in filenames]
+        client = self._get_client()
+        for i in range(0, len(keys), S3CheckpointStorage.MAX_DELETE_KEYS):
+            S3CheckpointStorage.s3_action_with_retry(
+                S3CheckpointStorage.REMOVE_FILES, client, self._bucket, keys[i : i + S3CheckpointStorage.MAX_DELETE_KEYS], None
+            )
+
     def upload_stream_to_file(
-        self, stream_creator, filename: str, chunk_size_MB: int = 64, max_concurrency: int = 10
+        self, stream_creator, filename: str, chunk_size_MB: int = 64, max_concurrency: Optional[int] = None
     ) -> None:
-        client = S3CheckpointStorage.get_client()
+        client = self._get_client()
+        if max_concurrency is None:
+            max_concurrency = self._upload_max_concurrency
         chunk_size = chunk_size_MB * 1048576
         config = boto3.s3.transfer.TransferConfig(multipart_chunksize=chunk_size, max_concurrency=max_concurrency)
         key = self.convert_path_to_key(filename)
@@ -401,11 +562,22 @@ class S3CheckpointStorage(BaseCheckpointStorage):
             S3CheckpointStorage.UPLOAD, client, self._bucket, key, config, upload_stream_creator=stream_creator
         )
 
+    def _get_client(self) -> "S3Client":
+        """
+        return the client shared by all threads using this storage. boto3 clients are
+        thread safe, but creating them from the shared default session is not, and files
+        are saved and loaded from several threads.
+        """
+        with self._client_lock:
+            if self._client is None:
+                self._client = S3CheckpointStorage.get_client()
+            return self._client
+
     def convert_path_to_key(self, path: str) -> str:
         return path if self._base_key is None else self._base_key + path
 
     def download_file_to_stream(self, filename: str, chunk_size_MB: int = 64, max_concurrency: int = 15) -> BytesIO:
-        client = S3CheckpointStorage.get_client()
+        client = self._get_client()
         key = self.convert_path_to_key(filename)
         chunk_size = chunk_size_MB * 1048576
         config = boto3.s3.transfer.TransferConfig(multipart_chunksize=chunk_size, max_concurrency=max_concurrency)
@@ -523,6 +695,17 @@ class S3CheckpointStorage(BaseCheckpointStorage):
                     assert not key.endswith("/")
                     client.delete_object(Bucket=bucket, Key=key)
                     return
+                elif action == S3CheckpointStorage.REMOVE_FILES:
+                    # key is a list of keys for this action
+                    response = client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in key]})
+                    errors = response.get("Errors", [])
+                    if len(errors) > 0:
+                        # s3 reports failures of individual keys in the response instead of raising.
+                        # Only the failed keys are retried, and the first error is raised so that
+                        # it goes through the same retry logic as the other actions.
+                        key = [error["Key"] for error in errors]
+                        raise botocore.exceptions.ClientError({"Error": errors[0]}, "DeleteObjects")
+                    return
                 elif action == S3CheckpointStorage.REMOVE_DIR:
                     prefix = key if key.endswith("/") else key + "/"
                     response = client.list_objects(Bucket=bucket, Prefix=prefix)
@@ -1,4 +1,5 @@
 # Standard Library
+import collections
 import os
 import time
 import pytest
@@ -15,6 +16,13 @@ from transformers import AutoModelForCausalLM, GPT2Config
 from transformers.models.gpt2.modeling_gpt2 import GPT2Block
 
 import neuronx_distributed as nxd
+from neuronx_distributed.trainer.checkpoint import (
+    _InternalTensorReference,
+    _assign_tensors_to_bins,
+    _coalesced_bin_layout,
+    _extract_tensor_info_and_update_state_dict,
+    _get_num_checkpoint_writers,
+)
 
 
 def get_model():
@@ -193,6 +201,157 @@ class TestCheckpoint(unittest.TestCase):
         torch.testing.assert_close(model.state_dict(), model_state, rtol=0, atol=0)
         torch.testing.assert_close(optimizer.state_dict(), opt_state, rtol=0, atol=0)
 
+    @patch.dict(os.environ, {"NXD_CKPT_COALESCE_TENSORS": "1"})
+    @patch("torch.distributed.is_initialized", MagicMock(return_value=True))
+    @patch("neuronx_distributed.pipeline.model.parallel_state.initialize_model_parallel", MagicMock(return_value=None))
+    @patch(
+        "neuronx_distributed.pipeline.model.parallel_state.model_parallel_is_initialized", MagicMock(return_value=True)
+    )
+    @patch(
+        "neuronx_distributed.pipeline.model.parallel_state.get_pipeline_model_parallel_size", MagicMock(return_value=8)
+    )
+    @patch(
+        "neuronx_distributed.pipeline.model.parallel_state.get_pipeline_model_parallel_rank", MagicMock(return_value=1)
+    )
+    @patch(
+        "neuronx_distributed.pipeline.model.parallel_state.get_tensor_model_parallel_size", MagicMock(return_value=8)
+    )
+    @patch(
+        "neuronx_distributed.pipeline.model.parallel_state.get_tensor_model_parallel_rank", MagicMock(return_value=1)
+    )
+    @patch("neuronx_distributed.pipeline.partition.get_pipeline_model_parallel_rank", MagicMock(return_value=1))
+    @patch("neuronx_distributed.pipeline.partition.get_pipeline_model_parallel_size", MagicMock(return_value=8))
+    @patch("neuronx_distributed.pipeline.model.NxDPPModel._create_pg_with_ranks", MagicMock(return_value=None))
+    @patch(
+        "neuronx_distributed.parallel_layers.parallel_state.get_data_parallel_group",
+        MagicMock(return_value=[[i] for i in range(64)]),
+    )
+    @patch(
+        "neuronx_distributed.trainer.checkpoint.get_data_parallel_group",
+        MagicMock(return_value=[[i] for i in range(64)]),
+    )
+    @patch(
+        "neuronx_distributed.parallel_layers.parallel_state.get_tensor_model_parallel_group",
+        MagicMock(return_value=None),
+    )
+    @patch(
+        "neuronx_distributed.optimizer.zero_redundancy_optimizer.model_parallel_is_initialized",
+        MagicMock(return_value=True),
+    )
+    @patch(
+        "neuronx_distributed.optimizer.zero_redundancy_optimizer.get_data_parallel_group",
+        MagicMock(return_value=[[i] for i in range(64)]),
+    )
+    @patch("neuronx_distributed.utils.model_utils.get_local_world_size", MagicMock(return_value=32))
+    @patch("neuronx_distributed.trainer.checkpoint.get_tensor_model_parallel_rank", MagicMock(return_value=1))
+    @patch("neuronx_distributed.trainer.checkpoint.get_pipeline_model_parallel_rank", MagicMock(return_value=1))
+    @patch("neuronx_distributed.trainer.checkpoint.get_local_world_size", MagicMock(return_value=32))
+    @patch("neuronx_distributed.trainer.trainer.get_expert_model_parallel_size", MagicMock(return_value=1))
+    @patch("neuronx_distributed.trainer.checkpoint.get_expert_model_parallel_size", MagicMock(return_value=1))
+    @patch("neuronx_distributed.trainer.checkpoint.get_expert_model_parallel_rank", MagicMock(return_value=0))
+    @patch("neuronx_distributed.trainer.checkpoint.get_expert_data_parallel_size", MagicMock(return_value=1))
+    @patch("neuronx_distributed.trainer.checkpoint.get_expert_data_parallel_rank", MagicMock(return_value=0))
+    @patch("neuronx_distributed.trainer.checkpoint.get_expert_model_parallel_group", MagicMock(return_value=None))
+    @patch(
+        "neuronx_distributed.trainer.checkpoint.get_expert_data_parallel_group",
+        MagicMock(return_value=[[i] for i in range(64)]),
+    )
+    @patch(
+        "neuronx_distributed.trainer.checkpoint.model_parallel_is_initialized",
+        MagicMock(return_value=True),
+    )
+    @patch("torch.distributed.get_rank", MagicMock(return_value=0))
+    def test_checkpoint_coalesced(self):
+        pipeline_cuts = [
+            "transformer.h.1",
+            "transformer.h.2",
+            "transformer.h.3",
+            "transformer.h.4",
+            "transformer.h.5",
+            "transformer.h.6",
+            "transformer.h.7",
+        ]
+        nxd_config = nxd.neuronx_distributed_config(
+            tensor_parallel_size=8,
+            pipeline_parallel_size=8,
+            pipeline_config={
+                "transformer_layer_cls": GPT2Block,
+                "tracer_cls": "hf",
+                "num_microbatches": 1,
+                "output_loss_value_spec": True,
+                "input_names": ["input_ids", "attention_mask", "labels"],
+                "pipeline_cuts": pipeline_cuts,
+                "param_init_fn": None,
+                "leaf_module_cls": ["GPT2Block"],
+                "use_zero1_optimizer": True,
+                "use_optimizer_wrapper": True,
+            },
+            optimizer_config={
+                "zero_one_enabled": True,
+                "grad_clipping": True,
+                "max_grad_norm": 1.0,
+            },
+            sequence_parallel=True,
+            activation_checkpoint_config="full",
+        )
+        model = nxd.initialize_parallel_model(nxd_config, get_model)
+        optimizer = nxd.initialize_parallel_optimizer(nxd_config, torch.optim.AdamW, model.parameters(), lr=1e-3)
+
+        model_state = deepcopy(model.state_dict())
+        opt_state = deepcopy(optimizer.state_dict())
+
+        nxd.save_checkpoint(
+            "ckpts",
+            "unittest_coalesced",
+            model=model,
+            optimizer=optimizer,
+            num_workers=8,
+            use_xser=True,
+        )
+
+        nxd.load_checkpoint(
+            "ckpts",
+            "unittest_coalesced",
+            model=model,
+            optimizer=optimizer,
+            num_workers=8,
+        )
+
+        # test save load functionality
+        torch.testing.assert_close(model.state_dict(), model_state, rtol=0, atol=0)
+        torch.testing.assert_close(optimizer.state_dict(), opt_state, rtol=0, atol=0)
+
+        # check format, each worker's tensors are coalesced into a single bin file
+        assert os.path.exists("ckpts/unittest_coalesced/done") and os.path.isfile("ckpts/unittest_coalesced/done")
+        for folder in ["model", "optim"]:
+            tensors_dir = f"ckpts/unittest_coalesced/{folder}/dp_rank_00_tp_rank_01_pp_rank_01.pt.tensors"
+            tensor_info = torch.load(f"ckpts/unittest_coalesced/{folder}/dp_rank_00_tp_rank_01_pp_rank_01.pt.info.pt")
+            assert all(info["bin"] == 0 and info["offset"] % 64 == 0 for info in tensor_info.values())
+            assert os.path.isfile(os.path.join(tensors_dir, "bin_0.raw"))
+            assert not any(f.startswith("tensor_") and f.endswith(".pt") for f in os.listdir(tensors_dir))
+
+        # bins are raw bytes, so dtypes without a numpy equivalent and zero-element tensors
+        # must be rebuilt from the info.pt entries. The second state_dict yields an empty bin file.
+        for tag, expected_state in [
+            (
+                "unittest_coalesced_dtypes",
+                {
+                    "bf16": torch.randn(3, 5, dtype=torch.bfloat16),
+                    "empty": torch.empty(0, 4),
+                    "int": torch.arange(7),
+                },
+            ),
+            ("unittest_coalesced_empty", {"empty": torch.empty(0, 4, dtype=torch.bfloat16)}),
+        ]:
+            state = {k: v.to(xm.xla_device()) for k, v in expected_state.items()}
+            nxd.save_checkpoint("ckpts", tag, model=state, num_workers=8, use_xser=True)
+            loaded_state = {}
+            nxd.load_checkpoint("ckpts", tag, model=loaded_state, num_workers=8)
+            torch.testing.assert_close(
+                {k: v.cpu() for k, v in loaded_state.items()}, expected_state, rtol=0, atol=0
+            )
+        assert os.path.getsize("ckpts/unittest_coalesced_empty/model/dp_rank_00_tp_rank_01_pp_rank_01.pt.tensors/bin_0.raw") == 0
+
     @pytest.mark.skipif(not version.parse(torch.__version__) >= version.parse("2.1"), reason="skip this test if no DCP support")
     @patch("torch.distributed.is_initialized", MagicMock(return_value=True))
     @patch("neuronx_distributed.pipeline.model.parallel_state.initialize_model_parallel", MagicMock(return_value=None))
@@ -331,6 +490,68 @@ class TestCheckpoint(unittest.TestCase):
         assert os.path.isfile("ckpts/unittest_dcp/optim/.metadata")
         assert os.path.isfile("ckpts/unittest_dcp/optim/__0_0.distcp")
 
+    def test_assign_tensors_to_bins(self):
+        tensors = [torch.zeros(n) for n in [1, 7, 3, 5, 2, 8]]
+        bins = _assign_tensors_to_bins(tensors, 3)
+
+        # largest tensors are placed first, each into the currently smallest bin
+        assert bins == [[5, 0], [1, 4], [3, 2]]
+        assert sorted(tidx for bin_tidxs in bins for tidx in bin_tidxs) == list(range(len(tensors)))
+
+    def test_coalesced_bin_layout(self):
+        tensors = [torch.zeros(3), torch.zeros(20, dtype=torch.bfloat16), torch.zeros(1)]
+        tensors[2].expert_model_parallel = True
+        layout = _coalesced_bin_layout(tensors, [[0, 1], [2]])
+
+        # offsets are aligned to 64 bytes, expert parallel tensors come first in their bin
+        assert layout == [(0, 0), (0, 64), (1, 0)]
+
+    def test_extract_tensor_info_and_update_state_dict(self):
+        Pair = collections.namedtuple("Pair", ["first", "second"])
+
+        def ref(tid, **kwargs):
+            return _InternalTensorReference(tid, torch.Size([tid]), torch.float32, False, **kwargs)
+
+        state_dict = {
+            "weight": ref(0),
+            "list": [ref(1), {"nested": ref(2)}],
+            "tuple": (ref(3), (ref(4), 5)),
+            "named": Pair(ref(5), "x"),
+            "binned": ref(6, bin_id=1, offset=64),
+            "step": 7,
+        }
+        tensor_info = {}
+        _extract_tensor_info_and_update_state_dict(state_dict, tensor_info)
+
+        def tid(v):
+            assert isinstance(v, xser.TensorReference)
+            return v.tid
+
+        # references are replaced inside dicts, lists, tuples and namedtuples
+        assert tid(state_dict["weight"]) == 0
+        assert tid(state_dict["list"][0]) == 1 and tid(state_dict["list"][1]["nested"]) == 2
+        assert tid(state_dict["tuple"][0]) == 3 and tid(state_dict["tuple"][1][0]) == 4
+        assert tid(state_dict["named"].first) == 5 and state_dict["named"].second == "x"
+        assert state_dict["step"] == 7
+        # containers keep their types, inner tuples included
+        assert type(state_dict["list"]) is list
+        assert type(state_dict["tuple"]) is tuple and type(state_dict["tuple"][1]) is tuple
+        assert state_dict["tuple"][1][1] == 5
+        assert type(state_dict["named"]) is Pair
+
+        assert sorted(tensor_info) == list(range(7))
+        assert tensor_info[3] == {"dtype": torch.float32, "shape": torch.Size([3]), "expert_model_parallel": False}
+        assert tensor_info[6]["bin"] == 1 and tensor_info[6]["offset"] == 64
+        assert "bin" not in tensor_info[0]
+
+    def test_get_num_checkpoint_writers(self):
+        with patch.dict(os.environ, {"NXD_CKPT_WRITERS": "8"}):
+            assert _get_num_checkpoint_writers() == 8
+        # invalid values fall back to the default instead of failing the checkpoint
+        for value in ["eight", "0"]:
+            with patch.dict(os.environ, {"NXD_CKPT_WRITERS": value}):
+                assert _get_num_checkpoint_writers() == 4
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,11 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
+import botocore
+import torch
+
 import neuronx_distributed as nxd
 
 MODULE = "neuronx_distributed.trainer.checkpoint_storage"
@@ -16,6 +21,137 @@ class S3CheckpointStorageTest(unittest.TestCase):
         # Assert
         self.assertEqual(resource, mock_boto3._get_default_session.return_value.resource.return_value)
 
+    @patch(f"{MODULE}.boto3")
+    def test_client_created_once(self, mock_boto3):
+        # Arrange
+        storage = nxd.trainer.checkpoint_storage.S3CheckpointStorage("s3://some_bucket/some_dir")
+        # Act
+        storage.remove_file("tag/file_0")
+        storage.remove_files(["tag/file_1"])
+        # Assert
+        self.assertEqual(mock_boto3._get_default_session.return_value.resource.call_count, 1)
+
+    @patch(f"{MODULE}.boto3")
+    def test_concurrent_saves_share_upload_threads(self, mock_boto3):
+        # Arrange
+        storage = nxd.trainer.checkpoint_storage.S3CheckpointStorage("s3://some_bucket/some_dir")
+        storage.set_num_concurrent_saves(4)
+        # Act
+        storage.save_text("1", "tag/done")
+        # Assert
+        self.assertEqual(mock_boto3.s3.transfer.TransferConfig.call_args.kwargs["max_concurrency"], 2)
+
+    @patch(f"{MODULE}.boto3")
+    def test_remove_files_batches_deletes(self, mock_boto3):
+        # Arrange
+        storage = nxd.trainer.checkpoint_storage.S3CheckpointStorage("s3://some_bucket/some_dir")
+        client = mock_boto3._get_default_session.return_value.resource.return_value.meta.client
+        # Act
+        storage.remove_files([f"tag/file_{i}" for i in range(1500)])
+        # Assert
+        self.assertEqual(client.delete_objects.call_count, 2)
+        first_batch = client.delete_objects.call_args_list[0].kwargs["Delete"]["Objects"]
+        self.assertEqual(len(first_batch), 1000)
+        self.assertEqual(first_batch[0], {"Key": "some_dir/tag/file_0"})
+
+    @patch(f"{MODULE}.time.sleep")
+    @patch(f"{MODULE}.boto3")
+    def test_remove_files_retries_failed_keys(self, mock_boto3, mock_sleep):
+        # Arrange
+        storage = nxd.trainer.checkpoint_storage.S3CheckpointStorage("s3://some_bucket/some_dir")
+        client = mock_boto3._get_default_session.return_value.resource.return_value.meta.client
+        client.delete_objects.side_effect = [
+            {"Errors": [{"Key": "some_dir/tag/file_1", "Code": "SlowDown", "Message": "Please reduce your request rate."}]},
+            {},
+        ]
+        # Act
+        storage.remove_files([f"tag/file_{i}" for i in range(3)])
+        # Assert
+        self.assertEqual(client.delete_objects.call_count, 2)
+        retried = client.delete_objects.call_args_list[1].kwargs["Delete"]["Objects"]
+        self.assertEqual(retried, [{"Key": "some_dir/tag/file_1"}])
+
+    @patch(f"{MODULE}.boto3")
+    def test_remove_files_raises_on_failed_keys(self, mock_boto3):
+        # Arrange
+        storage = nxd.trainer.checkpoint_storage.S3CheckpointStorage("s3://some_bucket/some_dir")
+        client = mock_boto3._get_default_session.return_value.resource.return_value.meta.client
+        client.delete_objects.return_value = {
+            "Errors": [{"Key": "some_dir/tag/file_0", "Code": "AccessDenied", "Message": "Access Denied"}]
+        }
+        # Act & Assert
+        with self.assertRaises(botocore.exceptions.ClientError):
+            storage.remove_files(["tag/file_0"])
+
+
+class FilesysCheckpointStorageTest(unittest.TestCase):
+    @patch(f"{MODULE}.FilesysCheckpointStorage._save_bytes_direct")
+    def test_save_bytes_buffered_by_default(self, mock_save_bytes_direct):
+        with tempfile.TemporaryDirectory() as dirname, patch.dict(os.environ):
+            # Arrange
+            os.environ.pop("NXD_CKPT_DIRECT_IO", None)
+            storage = nxd.trainer.checkpoint_storage.FilesysCheckpointStorage(dirname)
+            data = bytes(nxd.trainer.checkpoint_storage.FilesysCheckpointStorage.DIRECT_IO_THRESHOLD + 10)
+            # Act
+            storage.save_bytes(data, "blob.raw")
+            # Assert
+            mock_save_bytes_direct.assert_not_called()
+            self.assertEqual(os.path.getsize(os.path.join(dirname, "blob.raw")), len(data))
+
+    def test_list_tags_with_done(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            # Arrange
+            storage = nxd.trainer.checkpoint_storage.FilesysCheckpointStorage(dirname)
+            for tag, done in [("step_1", True), ("step_2", False)]:
+                storage.create_dir(tag)
+                storage.save_text("1", os.path.join(tag, "checkpoint"))
+                if done:
+                    storage.save_text("1", os.path.join(tag, "done"))
+            storage.create_dir("not_a_checkpoint")
+            # Act
+            tags_with_done = storage.list_tags_with_done()
+            # Assert
+            self.assertEqual(tags_with_done, {"step_1": True, "step_2": False})
+
+    def test_save_object_roundtrip(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            # Arrange
+            storage = nxd.trainer.checkpoint_storage.FilesysCheckpointStorage(dirname)
+            obj = {"weight": torch.arange(10, dtype=torch.bfloat16), "step": 3}
+            # Act
+            storage.save_object(obj, "obj.pt")
+            loaded = storage.load_object("obj.pt")
+            # Assert
+            torch.testing.assert_close(loaded, obj, rtol=0, atol=0)
+
+    @patch.dict(os.environ, {"NXD_CKPT_DIRECT_IO": "1"})
+    def test_save_bytes_roundtrip(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            storage = nxd.trainer.checkpoint_storage.FilesysCheckpointStorage(dirname)
+            # the second size is written with O_DIRECT where supported, and is not aligned
+            for nbytes in [10, nxd.trainer.checkpoint_storage.FilesysCheckpointStorage.DIRECT_IO_THRESHOLD + 10]:
+                # Arrange
+                data = os.urandom(nbytes)
+                # Act
+                storage.save_bytes(data, "blob.raw")
+                loaded = storage.load_bytes("blob.raw")
+                # Assert
+                self.assertEqual(bytes(loaded), data)
+
+    @patch.dict(os.environ, {"NXD_CKPT_DIRECT_IO": "1"})
+    @patch(f"{MODULE}.FilesysCheckpointStorage.DIRECT_IO_CHUNK_SIZE", 1048576)
+    def test_save_bytes_roundtrip_multiple_chunks(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            # Arrange
+            storage = nxd.trainer.checkpoint_storage.FilesysCheckpointStorage(dirname)
+            # written through the bounce buffer in several chunks, the last one is not aligned
+            data = os.urandom(nxd.trainer.checkpoint_storage.FilesysCheckpointStorage.DIRECT_IO_THRESHOLD + 10)
+            # Act
+            storage.save_bytes(memoryview(data), "blob.raw")
+            loaded = storage.load_bytes("blob.raw")
+            # Assert
+            self.assertEqual(bytes(loaded), data)
+
 
 if __name__ == "__main__":
     unittest.main()